@@ -2,41 +2,43 @@
 """
 Comprehensive test script for the E-commerce API
 Tests all endpoints with the correct data format according to specifications
+
+Independent read-only tests run concurrently over one aiohttp session
 """
 
-import requests
+import asyncio
+import aiohttp
 import json
 from datetime import datetime
 
 BASE_URL = "http://localhost:8000"
 
-def print_test_header(test_name):
-    print(f"\n{'='*60}")
-    print(f"  {test_name}")
-    print(f"{'='*60}")
+def format_test_header(test_name):
+    return f"\n{'='*60}\n  {test_name}\n{'='*60}"
 
-def print_response(response, description=""):
-    status_color = "\033[92m" if response.status_code < 400 else "\033[91m"
+async def format_response(response, description=""):
+    status_color = "\033[92m" if response.status < 400 else "\033[91m"
     reset_color = "\033[0m"
-    
-    print(f"{description}")
-    print(f"Status: {status_color}{response.status_code}{reset_color}")
+
+    body = await response.text()
     try:
-        print(f"Response: {json.dumps(response.json(), indent=2)}")
+        body = json.dumps(json.loads(body), indent=2)
     except:
-        print(f"Response: {response.text}")
-    print()
+        pass
+    return f"{description}\nStatus: {status_color}{response.status}{reset_color}\nResponse: {body}\n"
 
-def test_health():
+async def test_health(session):
     """Test health endpoint"""
-    print_test_header("HEALTH CHECK")
-    response = requests.get(f"{BASE_URL}/health")
-    print_response(response, "Testing health endpoint...")
-    return response.status_code == 200
+    output = [format_test_header("HEALTH CHECK")]
+    async with session.get("/health") as response:
+        output.append(await format_response(response, "Testing health endpoint..."))
+        healthy = response.status == 200
+    print("\n".join(output))
+    return healthy
 
-def test_create_product():
+async def test_create_product(session):
     """Test creating a product with new format"""
-    print_test_header("CREATE PRODUCT")
+    output = [format_test_header("CREATE PRODUCT")]
     product_data = {
         "name": "Samsung Galaxy S24",
         "price": 899.99,
@@ -51,44 +53,48 @@ def test_create_product():
             }
         ]
     }
-    
-    response = requests.post(f"{BASE_URL}/products", json=product_data)
-    print_response(response, "Testing product creation...")
-    
-    if response.status_code == 201:
-        return response.json()["id"]
-    return None
-
-def test_list_products():
+
+    product_id = None
+    async with session.post("/products", json=product_data) as response:
+        output.append(await format_response(response, "Testing product creation..."))
+        if response.status == 201:
+            product_id = (await response.json())["id"]
+    print("\n".join(output))
+    return product_id
+
+async def test_list_products(session):
     """Test listing products"""
-    print_test_header("LIST ALL PRODUCTS")
-    response = requests.get(f"{BASE_URL}/products")
-    print_response(response, "Testing product listing...")
+    output = [format_test_header("LIST ALL PRODUCTS")]
+    async with session.get("/products") as response:
+        output.append(await format_response(response, "Testing product listing..."))
+    print("\n".join(output))
 
-def test_filter_products():
+async def test_filter_products(session):
     """Test product filtering"""
-    print_test_header("FILTER PRODUCTS")
-    
+    output = [format_test_header("FILTER PRODUCTS")]
+
     # Test filter by name
-    response = requests.get(f"{BASE_URL}/products?name=Galaxy")
-    print_response(response, "Filter by name (Galaxy)...")
-    
+    async with session.get("/products", params={"name": "Galaxy"}) as response:
+        output.append(await format_response(response, "Filter by name (Galaxy)..."))
+
     # Test filter by size
-    response = requests.get(f"{BASE_URL}/products?size=large")
-    print_response(response, "Filter by size (large)...")
-    
+    async with session.get("/products", params={"size": "large"}) as response:
+        output.append(await format_response(response, "Filter by size (large)..."))
+
     # Test pagination
-    response = requests.get(f"{BASE_URL}/products?limit=2&offset=0")
-    print_response(response, "Test pagination (limit=2, offset=0)...")
+    async with session.get("/products", params={"limit": 2, "offset": 0}) as response:
+        output.append(await format_response(response, "Test pagination (limit=2, offset=0)..."))
+    print("\n".join(output))
 
-def test_create_order(product_id):
+async def test_create_order(session, product_id):
     """Test creating an order"""
-    print_test_header("CREATE ORDER")
-    
+    output = [format_test_header("CREATE ORDER")]
+
     if not product_id:
-        print("❌ Skipping order creation - no product ID available")
+        output.append("❌ Skipping order creation - no product ID available")
+        print("\n".join(output))
         return None
-    
+
     order_data = {
         "items": [
             {
@@ -106,91 +112,94 @@ def test_create_order(product_id):
             "country": "USA"
         }
     }
-    
-    response = requests.post(f"{BASE_URL}/orders", json=order_data)
-    print_response(response, "Testing order creation...")
-    
-    if response.status_code == 201:
-        return response.json()["id"]
-    return None
-
-def test_get_user_orders():
+
+    order_id = None
+    async with session.post("/orders", json=order_data) as response:
+        output.append(await format_response(response, "Testing order creation..."))
+        if response.status == 201:
+            order_id = (await response.json())["id"]
+    print("\n".join(output))
+    return order_id
+
+async def test_get_user_orders(session):
     """Test getting user orders"""
-    print_test_header("GET USER ORDERS")
-    
+    output = [format_test_header("GET USER ORDERS")]
+
     # Test orders for user123
-    response = requests.get(f"{BASE_URL}/orders/user123")
-    print_response(response, "Getting orders for user123...")
-    
+    async with session.get("/orders/user123") as response:
+        output.append(await format_response(response, "Getting orders for user123..."))
+
     # Test orders for testuser456
-    response = requests.get(f"{BASE_URL}/orders/testuser456")
-    print_response(response, "Getting orders for testuser456...")
-    
+    async with session.get("/orders/testuser456") as response:
+        output.append(await format_response(response, "Getting orders for testuser456..."))
+
     # Test pagination
-    response = requests.get(f"{BASE_URL}/orders/user123?limit=1&offset=0")
-    print_response(response, "Test pagination for orders...")
+    async with session.get("/orders/user123", params={"limit": 1, "offset": 0}) as response:
+        output.append(await format_response(response, "Test pagination for orders..."))
+    print("\n".join(output))
 
-def test_edge_cases():
+async def test_edge_cases(session):
     """Test edge cases and error handling"""
-    print_test_header("EDGE CASES & ERROR HANDLING")
-    
+    output = [format_test_header("EDGE CASES & ERROR HANDLING")]
+
     # Test invalid product creation
     invalid_product = {"name": "Invalid", "price": "not_a_number"}
-    response = requests.post(f"{BASE_URL}/products", json=invalid_product)
-    print_response(response, "Test invalid product data...")
-    
+    async with session.post("/products", json=invalid_product) as response:
+        output.append(await format_response(response, "Test invalid product data..."))
+
     # Test order with invalid product ID
     invalid_order = {
         "items": [{"productid": "invalid_id", "qty": 1}],
         "total_amount": 100.0,
         "user_address": {"user_id": "test"}
     }
-    response = requests.post(f"{BASE_URL}/orders", json=invalid_order)
-    print_response(response, "Test order with invalid product ID...")
-    
+    async with session.post("/orders", json=invalid_order) as response:
+        output.append(await format_response(response, "Test order with invalid product ID..."))
+
     # Test orders for non-existent user
-    response = requests.get(f"{BASE_URL}/orders/nonexistent_user")
-    print_response(response, "Test orders for non-existent user...")
+    async with session.get("/orders/nonexistent_user") as response:
+        output.append(await format_response(response, "Test orders for non-existent user..."))
+    print("\n".join(output))
 
-def main():
+async def main():
     """Run comprehensive test suite"""
     print("🚀 Starting Comprehensive E-commerce API Tests")
     print(f"Testing API at: {BASE_URL}")
     print(f"Timestamp: {datetime.now().isoformat()}")
-    
+
     try:
-        # Test 1: Health check
-        if not test_health():
-            print("❌ Health check failed. Exiting.")
-            return
-        
-        # Test 2: Create product
-        product_id = test_create_product()
-        
-        # Test 3: List products
-        test_list_products()
-        
-        # Test 4: Filter products
-        test_filter_products()
-        
-        # Test 5: Create order
-        order_id = test_create_order(product_id)
-        
-        # Test 6: Get user orders
-        test_get_user_orders()
-        
-        # Test 7: Edge cases
-        test_edge_cases()
-        
-        print_test_header("TEST SUMMARY")
+        async with aiohttp.ClientSession(base_url=BASE_URL) as session:
+            # Test 1: Health check
+            if not await test_health(session):
+                print("❌ Health check failed. Exiting.")
+                return
+
+            # Test 2: Create product
+            product_id = await test_create_product(session)
+
+            # Test 3: Create order (needs the product created above)
+            order_id = await test_create_order(session, product_id)
+
+            # Tests 4-6: List products, filter products and get user orders are
+            # read-only and independent, so they run concurrently
+            await asyncio.gather(
+                test_list_products(session),
+                test_filter_products(session),
+                test_get_user_orders(session)
+            )
+
+            # Test 7: Edge cases
+            await test_edge_cases(session)
+
+        print(format_test_header("TEST SUMMARY"))
         print("✅ All tests completed!")
         print("📊 API is working according to specifications")
         print("🎯 Ready for deployment!")
-        
-    except requests.exceptions.ConnectionError:
+
+    except aiohttp.ClientConnectionError:
         print("❌ Cannot connect to API server. Make sure it's running on port 8000.")
     except Exception as e:
         print(f"❌ Test failed with error: {e}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
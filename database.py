@@ -1,45 +1,84 @@
 """
 Database configuration and connection management
 """
+import asyncio
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
 from dotenv import load_dotenv
+from fastapi import Request
 
 # Load environment variables
 load_dotenv()
 
+# How long a health check ping result is reused before the server is pinged again
+HEALTH_CHECK_TTL_SECONDS = 2.0
+
+# Topologies that support multi-document transactions (not a standalone "Single" server)
+TRANSACTION_TOPOLOGY_TYPES = {"ReplicaSetWithPrimary", "Sharded", "LoadBalanced"}
+
 class DatabaseManager:
     def __init__(self):
         self.mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
         self.database_name = os.getenv("DATABASE_NAME", "ecommerce")
+        self.max_pool_size = int(os.getenv("MONGODB_MAX_POOL_SIZE", "200"))
+        self.min_pool_size = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))
+        # Query old-format products (top-level "size") in place instead of migrating them
+        self.support_legacy_size = os.getenv("SUPPORT_LEGACY_SIZE") == "1"
         self.client = None
         self.db = None
         self.products_collection = None
         self.orders_collection = None
+        self.supports_transactions = False
+        self._health_lock = asyncio.Lock()
+        self._last_ping_ts = 0.0
+        self._last_ping_result = None
+        self._setup_task = None
         self._connect()
 
     def _connect(self):
-        """Establish MongoDB connection"""
+        """Create the MongoDB client (no I/O happens until init() is awaited)"""
         try:
-            self.client = MongoClient(
-                self.mongodb_url, 
+            self.client = AsyncIOMotorClient(
+                self.mongodb_url,
+                maxPoolSize=self.max_pool_size,
+                minPoolSize=self.min_pool_size,
+                maxIdleTimeMS=300000,
+                waitQueueTimeoutMS=10000,
+                retryWrites=True,
                 serverSelectionTimeoutMS=10000,
                 connectTimeoutMS=10000,
                 socketTimeoutMS=10000
             )
-            
+        except Exception as e:
+            print(f"❌ Unexpected database error: {e}")
+
+    async def init(self):
+        """Verify the MongoDB connection and prepare collections and indexes"""
+        if self.client is None:
+            return
+
+        try:
             # Test connection
-            self.client.admin.command('ping')
+            await self.client.admin.command('ping')
             
             self.db = self.client[self.database_name]
             self.products_collection = self.db.products
             self.orders_collection = self.db.orders
             
-            # Create indexes for better performance
-            self._create_indexes()
+            # Multi-document transactions need a replica set or sharded cluster;
+            # the ping above already made the driver discover the topology
+            self.supports_transactions = (
+                self.client.topology_description.topology_type_name in TRANSACTION_TOPOLOGY_TYPES
+            )
+            
+            # Build indexes and migrate old data without holding up startup
+            self._setup_task = asyncio.create_task(self._prepare_collections())
             
             print("✅ Connected to MongoDB successfully!")
+            self.log_pool_status()
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             print(f"❌ MongoDB connection error: {e}")
@@ -47,39 +86,132 @@ class DatabaseManager:
         except Exception as e:
             print(f"❌ Unexpected database error: {e}")
 
-    def _create_indexes(self):
+    async def _prepare_collections(self):
+        """Create indexes and migrate old-format products"""
+        await self._create_indexes()
+        await self._drop_obsolete_indexes()
+        
+        if not self.support_legacy_size:
+            await self._migrate_legacy_products()
+
+    async def _create_indexes(self):
         """Create database indexes for better performance"""
         try:
             # Index on product name for search
-            self.products_collection.create_index([("name", "text")])
+            await self.products_collection.create_index([("name", "text")], background=True)
+            
+            # Index on product name for regex (prefix) search
+            await self.products_collection.create_index("name", background=True)
+            
+            # Index on the size field queried within the sizes array
+            await self.products_collection.create_index("sizes.size", background=True)
             
-            # Index on product size
-            self.products_collection.create_index("size")
+            if self.support_legacy_size:
+                # Old-format top-level size, so every branch of the legacy $or size filter is indexed
+                await self.products_collection.create_index("size", background=True)
             
-            # Index on user_id in orders for faster user order queries
-            self.orders_collection.create_index("user_address.user_id")
+            # Compound index so user order queries sorted by _id avoid an in-memory sort
+            await self.orders_collection.create_index(
+                [("user_address.user_id", ASCENDING), ("_id", ASCENDING)], background=True
+            )
             
             print("✅ Database indexes created successfully!")
             
         except Exception as e:
             print(f"⚠️ Warning: Could not create indexes: {e}")
 
+    async def _drop_obsolete_indexes(self):
+        """Drop indexes that earlier versions created but no query uses any more"""
+        obsolete_indexes = [
+            # Prefix of the (user_address.user_id, _id) compound index
+            (self.orders_collection, "user_address.user_id_1"),
+        ]
+        if not self.support_legacy_size:
+            # Top-level "size" field; products are queried on sizes.size once migrated
+            obsolete_indexes.append((self.products_collection, "size_1"))
+        for collection, index_name in obsolete_indexes:
+            try:
+                await collection.drop_index(index_name)
+                print(f"✅ Dropped obsolete index {index_name}")
+            except OperationFailure:
+                # Index does not exist (already dropped or never created)
+                pass
+            except Exception as e:
+                print(f"⚠️ Warning: Could not drop index {index_name}: {e}")
+
+    async def _migrate_legacy_products(self):
+        """Convert old-format products (size/inventory_count) to the sizes array"""
+        try:
+            result = await self.products_collection.update_many(
+                {"size": {"$exists": True}, "sizes": {"$exists": False}},
+                [
+                    {"$set": {"sizes": [{"size": "$size", "quantity": {"$ifNull": ["$inventory_count", 0]}}]}},
+                    {"$unset": ["size", "inventory_count"]}
+                ]
+            )
+            if result.modified_count:
+                print(f"✅ Migrated {result.modified_count} old-format products")
+                
+        except Exception as e:
+            print(f"⚠️ Warning: Could not migrate old-format products: {e}")
+
+    async def close(self):
+        """Stop background setup work and close the MongoDB client"""
+        if self._setup_task is not None and not self._setup_task.done():
+            # Don't let client.close() pull the connection out from under the setup task
+            self._setup_task.cancel()
+            try:
+                await self._setup_task
+            except asyncio.CancelledError:
+                print("⚠️ Warning: Index setup/migration was interrupted by shutdown and will rerun on next startup")
+        
+        if self.client:
+            self.client.close()
+
+    def log_pool_status(self):
+        """Log the driver's view of the cluster topology and connection pools"""
+        if self.client:
+            print(f"📊 MongoDB topology: {self.client.topology_description}")
+
     def is_connected(self):
         """Check if database is connected and available"""
         return (self.client is not None and 
                 self.products_collection is not None and 
                 self.orders_collection is not None)
 
-    def health_check(self):
+    def _cached_health(self):
+        """Return the last health check result while it is still fresh"""
+        if (self._last_ping_result is not None and
+                time.monotonic() - self._last_ping_ts < HEALTH_CHECK_TTL_SECONDS):
+            return dict(self._last_ping_result)
+        return None
+
+    async def health_check(self):
         """Perform a health check on the database connection"""
-        try:
-            if self.client:
-                self.client.admin.command('ping')
-                return {"status": "healthy", "database": "connected"}
-            else:
-                return {"status": "degraded", "database": "disconnected", "message": "Running without database"}
-        except Exception as e:
-            return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+        if not self.client:
+            return {"status": "degraded", "database": "disconnected", "message": "Running without database"}
+        
+        cached = self._cached_health()
+        if cached is not None:
+            return cached
+        
+        # Only one ping is in flight at a time; concurrent probes reuse its result
+        async with self._health_lock:
+            cached = self._cached_health()
+            if cached is not None:
+                return cached
+            
+            try:
+                await self.client.admin.command('ping')
+                result = {"status": "healthy", "database": "connected"}
+            except Exception as e:
+                self.log_pool_status()
+                result = {"status": "unhealthy", "database": "disconnected", "error": str(e)}
+            
+            self._last_ping_ts = time.monotonic()
+            self._last_ping_result = result
+            return dict(result)
 
-# Global database manager instance
-db_manager = DatabaseManager()
+def get_db(request: Request) -> DatabaseManager:
+    """FastAPI dependency returning the database manager created at startup"""
+    return request.app.state.db
@@ -4,11 +4,12 @@ E-commerce FastAPI Backend Application
 A modular FastAPI application for e-commerce platform similar to Flipkart/Amazon.
 Built for HROne Backend Intern Hiring Task.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from database import db_manager
+from database import DatabaseManager
 from models import HealthResponse
+from utils import MongoJSONResponse
 from routers import products, orders
 
 # Create FastAPI app
@@ -17,7 +18,8 @@ app = FastAPI(
     description="FastAPI backend for ecommerce application - HROne Hiring Task",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=MongoJSONResponse
 )
 
 # Add CORS middleware for frontend integration
@@ -45,27 +47,30 @@ async def root():
     }
 
 @app.get("/health", response_model=HealthResponse, tags=["health"])
-async def health_check():
+async def health_check(request: Request):
     """
     Comprehensive health check endpoint
     
     Returns the status of the API and database connectivity
     """
-    return db_manager.health_check()
+    return await request.app.state.db.health_check()
 
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_event():
     """Actions to perform on application startup"""
     print("🚀 Starting E-commerce API...")
-    print(f"📊 Database status: {'Connected' if db_manager.is_connected() else 'Disconnected'}")
+    app.state.db = DatabaseManager()
+    await app.state.db.init()
+    print(f"📊 Database status: {'Connected' if app.state.db.is_connected() else 'Disconnected'}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Actions to perform on application shutdown"""
     print("🛑 Shutting down E-commerce API...")
-    if db_manager.client:
-        db_manager.client.close()
+    db = getattr(app.state, "db", None)
+    if db and db.client:
+        await db.close()
         print("📊 Database connection closed")
 
 if __name__ == "__main__":
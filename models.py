@@ -1,7 +1,7 @@
 """
 Pydantic models for request/response validation
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from bson import ObjectId
@@ -15,8 +15,10 @@ class ProductCreate(BaseModel):
     price: float
     sizes: List[SizeInfo]
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        populate_by_name=True,
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "name": "iPhone 14 Pro",
                 "price": 999.99,
@@ -28,6 +30,7 @@ class ProductCreate(BaseModel):
                 ]
             }
         }
+    )
 
 class Product(BaseModel):
     id: str = Field(alias="_id")
@@ -36,29 +39,42 @@ class Product(BaseModel):
     sizes: List[SizeInfo]
     created_at: datetime
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, json_encoders={ObjectId: str})
 
 class OrderItem(BaseModel):
     productid: str
     qty: int
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "productid": "507f1f77bcf86cd799439011",
                 "qty": 3
             }
         }
+    )
+
+class UserAddress(BaseModel):
+    user_id: str
+    street: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip: Optional[str] = None
+    country: Optional[str] = None
+
+    # Keep any additional address fields supplied by the client, and accept
+    # numeric values such as "zip": 10001 as the untyped dict used to
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
 
 class OrderCreate(BaseModel):
     items: List[OrderItem]
     total_amount: float
-    user_address: Dict[str, Any]
+    user_address: UserAddress
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        populate_by_name=True,
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "items": [
                     {
@@ -77,17 +93,16 @@ class OrderCreate(BaseModel):
                 }
             }
         }
+    )
 
 class Order(BaseModel):
     id: str = Field(alias="_id")
     items: List[OrderItem]
     total_amount: float
-    user_address: Dict[str, Any]
+    user_address: UserAddress
     created_at: datetime
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, json_encoders={ObjectId: str})
 
 class ProductsResponse(BaseModel):
     data: List[Product]
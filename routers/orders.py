@@ -1,20 +1,72 @@
 """
 Order-related API endpoints
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timezone
 from bson import ObjectId
-from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
 
-from database import db_manager
+from database import DatabaseManager, get_db
 from models import OrderCreate, OrdersResponse
-from utils import prepare_order_response
+from utils import build_page_info, encode_json, prepare_order_response, product_list_cache
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+# Fields returned by get_user_orders
+ORDER_LIST_PROJECTION = {
+    "items": 1,
+    "total_amount": 1,
+    "user_address": 1,
+    "created_at": 1
+}
+
+# Orders read from the cursor and enriched per product lookup while streaming
+ORDER_STREAM_BATCH_SIZE = 25
+
+INVENTORY_CHANGED_DETAIL = "Insufficient inventory: stock changed while the order was being placed, please retry"
+
+def _guarded_deduction(product_object_id: ObjectId, size_index: int, quantity: int) -> Tuple[Dict, Dict]:
+    """
+    Build the filter and update for an inventory decrement that only matches while enough stock remains
+    """
+    quantity_field = f"sizes.{size_index}.quantity"
+    return (
+        {"_id": product_object_id, quantity_field: {"$gte": quantity}},
+        {"$inc": {quantity_field: -quantity}}
+    )
+
+async def _restore_inventory(db: DatabaseManager, applied: List[Tuple[ObjectId, int, int]]):
+    """
+    Give back inventory taken by previously applied decrements
+    """
+    for product_object_id, size_index, quantity in applied:
+        await db.products_collection.update_one(
+            {"_id": product_object_id},
+            {"$inc": {f"sizes.{size_index}.quantity": quantity}}
+        )
+
+async def _deduct_inventory(db: DatabaseManager, deductions: List[Tuple[ObjectId, int, int]]) -> bool:
+    """
+    Apply guarded inventory decrements one by one without a transaction
+
+    Already applied decrements are restored if any of them fails to match
+    """
+    applied = []
+    for product_object_id, size_index, quantity in deductions:
+        result = await db.products_collection.update_one(
+            *_guarded_deduction(product_object_id, size_index, quantity)
+        )
+        if result.matched_count == 0:
+            await _restore_inventory(db, applied)
+            return False
+        applied.append((product_object_id, size_index, quantity))
+    return True
+
 @router.post("", status_code=201, response_model=dict)
-async def create_order(order: OrderCreate):
+async def create_order(order: OrderCreate, db: DatabaseManager = Depends(get_db)):
     """
     Create a new order
     
@@ -22,55 +74,98 @@ async def create_order(order: OrderCreate):
     - **total_amount**: Total amount for the order
     - **user_address**: User address information including user_id
     """
-    if not db_manager.is_connected():
+    if not db.is_connected():
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        # Validate that all products exist and have sufficient inventory
+        # Validate and parse all product IDs once, up front
         for item in order.items:
-            try:
-                product_object_id = ObjectId(item.productid)
-            except InvalidId:
+            if not ObjectId.is_valid(item.productid):
                 raise HTTPException(status_code=400, detail=f"Invalid product ID format: {item.productid}")
-            
-            product = db_manager.products_collection.find_one({"_id": product_object_id})
+        product_ids = [ObjectId(item.productid) for item in order.items]
+        
+        # Fetch every ordered product in a single round-trip
+        products = {
+            product["_id"]: product
+            async for product in db.products_collection.find(
+                {"_id": {"$in": product_ids}}, {"sizes": 1}
+            )
+        }
+        
+        # Validate that all products exist and have sufficient inventory,
+        # planning the deductions (taken from the first available sizes) as we go
+        deductions = []
+        for item, product_object_id in zip(order.items, product_ids):
+            product = products.get(product_object_id)
             if not product:
                 raise HTTPException(status_code=404, detail=f"Product {item.productid} not found")
             
             # Check inventory across all sizes
-            total_inventory = sum(size_info["quantity"] for size_info in product.get("sizes", []))
+            sizes = product.get("sizes", [])
+            total_inventory = sum(size_info["quantity"] for size_info in sizes)
             if total_inventory < item.qty:
                 raise HTTPException(
                     status_code=400, 
                     detail=f"Insufficient inventory for product {item.productid}. Available: {total_inventory}, Requested: {item.qty}"
                 )
-        
-        # Create order
-        order_dict = order.model_dump()
-        order_dict["created_at"] = datetime.now()
-        
-        result = db_manager.orders_collection.insert_one(order_dict)
-        
-        # Update product inventories (decrease from first available size)
-        for item in order.items:
-            product = db_manager.products_collection.find_one({"_id": ObjectId(item.productid)})
-            remaining_qty = item.qty
             
-            for i, size_info in enumerate(product["sizes"]):
+            remaining_qty = item.qty
+            for i, size_info in enumerate(sizes):
                 if remaining_qty <= 0:
                     break
-                    
-                available = size_info["quantity"]
-                to_deduct = min(available, remaining_qty)
                 
-                # Update the specific size quantity
-                db_manager.products_collection.update_one(
-                    {"_id": ObjectId(item.productid)},
-                    {"$inc": {f"sizes.{i}.quantity": -to_deduct}}
-                )
+                to_deduct = min(size_info["quantity"], remaining_qty)
+                if to_deduct <= 0:
+                    continue
                 
+                # Keep the in-memory copy current so repeated items see the reduced stock
+                size_info["quantity"] -= to_deduct
+                deductions.append((product_object_id, i, to_deduct))
                 remaining_qty -= to_deduct
         
+        # Create order
+        order_dict = order.model_dump(mode="python", exclude_unset=True)
+        order_dict["created_at"] = datetime.now(timezone.utc)
+        
+        if db.supports_transactions:
+            # Insert the order and deduct inventory atomically
+            async def place_order(session):
+                inserted = await db.orders_collection.insert_one(order_dict, session=session)
+                
+                if deductions:
+                    update_result = await db.products_collection.bulk_write(
+                        [UpdateOne(*_guarded_deduction(*deduction)) for deduction in deductions],
+                        session=session
+                    )
+                    if update_result.matched_count < len(deductions):
+                        # Raising inside the transaction aborts it, discarding the order
+                        raise HTTPException(status_code=400, detail=INVENTORY_CHANGED_DETAIL)
+                return inserted
+            
+            try:
+                async with await db.client.start_session() as session:
+                    # Retries on write conflicts with concurrent orders and unknown commit results
+                    result = await session.with_transaction(place_order)
+            except PyMongoError as e:
+                if e.has_error_label("TransientTransactionError"):
+                    # Still conflicting after the driver's retries
+                    raise HTTPException(status_code=400, detail=INVENTORY_CHANGED_DETAIL)
+                raise
+        else:
+            # Standalone servers have no transactions: reserve stock first, then insert the order
+            if not await _deduct_inventory(db, deductions):
+                raise HTTPException(status_code=400, detail=INVENTORY_CHANGED_DETAIL)
+            
+            try:
+                result = await db.orders_collection.insert_one(order_dict)
+            except Exception:
+                # The order was not saved, so release the reserved stock
+                await _restore_inventory(db, deductions)
+                raise
+        
+        # Inventory changed, so cached product listings are out of date
+        product_list_cache.clear()
+        
         # Return just the ID as per specification
         return {"id": str(result.inserted_id)}
         
@@ -80,11 +175,97 @@ async def create_order(order: OrderCreate):
         print(f"Error creating order: {e}")
         raise HTTPException(status_code=500, detail=f"Error creating order: {str(e)}")
 
+async def _enrich_orders(db: DatabaseManager, orders: List[Dict]) -> List[Dict]:
+    """
+    Prepare orders for the response, attaching product details to every item
+    """
+    # Fetch the names of every product referenced by these orders in a single query
+    product_ids = {
+        ObjectId(item["productid"])
+        for order in orders
+        for item in order.get("items", [])
+        if ObjectId.is_valid(item.get("productid"))
+    }
+    product_names = {}
+    if product_ids:
+        product_names = {
+            product["_id"]: product.get("name", "Unknown Product")
+            async for product in db.products_collection.find(
+                {"_id": {"$in": list(product_ids)}}, {"name": 1}
+            )
+        }
+    
+    processed_orders = []
+    for order in orders:
+        processed_order = prepare_order_response(order)
+        if processed_order:
+            # Enrich items with product details
+            for item in processed_order.get("items", []):
+                if not ObjectId.is_valid(item.get("productid")):
+                    item["productDetails"] = {
+                        "name": "Unknown Product",
+                        "id": item.get("productid")
+                    }
+                    continue
+                
+                product_object_id = ObjectId(item["productid"])
+                if product_object_id in product_names:
+                    item["productDetails"] = {
+                        "name": product_names[product_object_id],
+                        "id": str(product_object_id)
+                    }
+            
+            processed_orders.append(processed_order)
+    
+    return processed_orders
+
+async def _stream_user_orders(
+    db: DatabaseManager, db_cursor, first_batch: List[Dict], limit: int, offset: int, cursor: Optional[str]
+):
+    """
+    Yield the orders response body as JSON, one enriched batch at a time
+
+    The cursor fetches limit + 1 documents; the extra one only signals that a next page exists
+    """
+    yield b'{"data":['
+    
+    emitted = 0
+    has_more = False
+    last_order_id = None
+    batch = first_batch
+    
+    try:
+        while batch:
+            if emitted + len(batch) > limit:
+                has_more = True
+                batch = batch[:limit - emitted]
+            
+            for processed_order in await _enrich_orders(db, batch):
+                yield (b"," if emitted else b"") + encode_json(processed_order)
+                emitted += 1
+            
+            if batch:
+                last_order_id = batch[-1]["_id"]
+            if has_more:
+                break
+            
+            batch = await db_cursor.to_list(length=ORDER_STREAM_BATCH_SIZE)
+            
+    except Exception as e:
+        # Headers are already sent, so the response can only be cut short
+        print(f"Error streaming orders: {e}")
+        raise
+    
+    page = build_page_info(limit, has_more, last_order_id, offset, cursor)
+    yield b'],"page":' + encode_json(page) + b'}'
+
 @router.get("/{user_id}", response_model=dict)
 async def get_user_orders(
     user_id: str,
     limit: Optional[int] = Query(10, ge=1, le=100, description="Number of documents to return"),
-    offset: Optional[int] = Query(0, ge=0, description="Number of documents to skip")
+    offset: Optional[int] = Query(0, ge=0, description="Number of documents to skip"),
+    cursor: Optional[str] = Query(None, description="Value of page.next from the previous page (keyset pagination)"),
+    db: DatabaseManager = Depends(get_db)
 ):
     """
     Get orders for a specific user
@@ -92,61 +273,38 @@ async def get_user_orders(
     - **user_id**: The user ID to fetch orders for
     - **limit**: Number of orders to return (1-100)
     - **offset**: Number of orders to skip for pagination
+    - **cursor**: Continue after the last order of the previous page (ignores **offset**)
     """
-    if not db_manager.is_connected():
+    if not db.is_connected():
         raise HTTPException(status_code=503, detail="Database not available")
     
+    if cursor is not None and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    
     try:
         # Filter by user_id in user_address
         query_filter = {"user_address.user_id": user_id}
         
-        # Get total count for the query
-        total_count = db_manager.orders_collection.count_documents(query_filter)
-        
-        # Execute query with pagination
-        cursor = (db_manager.orders_collection
-                 .find(query_filter)
-                 .sort("_id", 1)
-                 .skip(offset)
-                 .limit(limit))
-        
-        orders = list(cursor)
+        if cursor is not None:
+            # Seek past the previous page using the (user_id, _id) index
+            query_filter["_id"] = {"$gt": ObjectId(cursor)}
         
-        # Prepare response - need to enrich with product details
-        processed_orders = []
-        for order in orders:
-            processed_order = prepare_order_response(order)
-            if processed_order:
-                # Enrich items with product details
-                for item in processed_order.get("items", []):
-                    try:
-                        product = db_manager.products_collection.find_one({"_id": ObjectId(item["productid"])})
-                        if product:
-                            item["productDetails"] = {
-                                "name": product.get("name", "Unknown Product"),
-                                "id": str(product["_id"])
-                            }
-                    except:
-                        item["productDetails"] = {
-                            "name": "Unknown Product",
-                            "id": item["productid"]
-                        }
-                
-                processed_orders.append(processed_order)
-        
-        # Calculate pagination info
-        next_offset = offset + limit if offset + limit < total_count else None
-        prev_offset = max(0, offset - limit) if offset > 0 else None
+        # Execute query with pagination, fetching one extra document to detect a next page
+        db_cursor = (db.orders_collection
+                    .find(query_filter, ORDER_LIST_PROJECTION)
+                    .sort("_id", 1))
+        if cursor is None and offset:
+            db_cursor = db_cursor.skip(offset)
+        db_cursor = db_cursor.limit(limit + 1)
         
-        return {
-            "data": processed_orders,
-            "page": {
-                "next": str(next_offset) if next_offset is not None else None,
-                "limit": limit,
-                "previous": str(prev_offset) if prev_offset is not None else None
-            }
-        }
+        # Read the first batch before responding so query errors still produce a 500
+        first_batch = await db_cursor.to_list(length=ORDER_STREAM_BATCH_SIZE)
         
     except Exception as e:
         print(f"Error fetching orders: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching orders: {str(e)}")
+    
+    return StreamingResponse(
+        _stream_user_orders(db, db_cursor, first_batch, limit, offset, cursor),
+        media_type="application/json"
+    )
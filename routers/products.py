@@ -1,18 +1,29 @@
 """
 Product-related API endpoints
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from bson import ObjectId
 
-from database import db_manager
+from database import DatabaseManager, get_db
 from models import ProductCreate, ProductsResponse
-from utils import prepare_product_response, build_product_query_filter
+from utils import prepare_product_response, build_page_info, build_product_query_filter, product_list_cache
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Fields returned by list_products (size/inventory_count are needed to convert old-format documents)
+PRODUCT_LIST_PROJECTION = {
+    "name": 1,
+    "price": 1,
+    "sizes": 1,
+    "created_at": 1,
+    "size": 1,
+    "inventory_count": 1
+}
+
 @router.post("", status_code=201, response_model=dict)
-async def create_product(product: ProductCreate):
+async def create_product(product: ProductCreate, db: DatabaseManager = Depends(get_db)):
     """
     Create a new product
     
@@ -20,16 +31,17 @@ async def create_product(product: ProductCreate):
     - **price**: Product price  
     - **sizes**: Array of size objects with size and quantity
     """
-    if not db_manager.is_connected():
+    if not db.is_connected():
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
         # Convert to dict and add timestamp
-        product_dict = product.model_dump()
-        product_dict["created_at"] = datetime.now()
+        product_dict = product.model_dump(mode="python")
+        product_dict["created_at"] = datetime.now(timezone.utc)
         
         # Insert product
-        result = db_manager.products_collection.insert_one(product_dict)
+        result = await db.products_collection.insert_one(product_dict)
+        product_list_cache.clear()
         
         # Return just the ID as per specification
         return {"id": str(result.inserted_id)}
@@ -40,54 +52,78 @@ async def create_product(product: ProductCreate):
 
 @router.get("", response_model=dict)
 async def list_products(
-    name: Optional[str] = Query(None, description="Filter by product name (supports partial/regex search)"),
+    name: Optional[str] = Query(None, description="Filter by product name (full-text search)"),
+    prefix: Optional[bool] = Query(False, description="Match name as a case-insensitive prefix (or regex) instead of full-text search"),
     size: Optional[str] = Query(None, description="Filter by product size"),
     limit: Optional[int] = Query(10, ge=1, le=100, description="Number of documents to return"),
-    offset: Optional[int] = Query(0, ge=0, description="Number of documents to skip")
+    offset: Optional[int] = Query(0, ge=0, description="Number of documents to skip"),
+    cursor: Optional[str] = Query(None, description="Value of page.next from the previous page (keyset pagination)"),
+    db: DatabaseManager = Depends(get_db)
 ):
     """
     List products with optional filtering and pagination
     
-    - **name**: Filter by product name (case-insensitive, supports partial matches)
+    - **name**: Filter by product name (full-text search, results ordered by relevance)
+    - **prefix**: Match **name** as a case-insensitive prefix; input containing regex metacharacters is used as a regex
     - **size**: Filter by exact size match (searches within sizes array)
     - **limit**: Number of products to return (1-100)
     - **offset**: Number of products to skip for pagination
+    - **cursor**: Continue after the last product of the previous page (ignores **offset**)
     """
-    if not db_manager.is_connected():
+    if not db.is_connected():
         raise HTTPException(status_code=503, detail="Database not available")
     
+    # Relevance-ordered text search cannot be resumed from an _id
+    keyset = not name or prefix
+    
+    if cursor is not None:
+        if not keyset:
+            raise HTTPException(status_code=400, detail="cursor pagination is not supported for full-text name search, use offset")
+        if not ObjectId.is_valid(cursor):
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    
+    # Popular searches and first pages are served from the cache
+    cache_key = (name, prefix, size, limit, offset, cursor)
+    cached = product_list_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    # Products or inventory may change while the query is in flight
+    cache_generation = product_list_cache.generation
+    
     try:
         # Build query filter
-        query_filter = {}
-        
-        if name:
-            # Support partial/regex search for name (case-insensitive)
-            query_filter["name"] = {"$regex": name, "$options": "i"}
+        query_filter = build_product_query_filter(name, size, prefix, db.support_legacy_size)
+        projection = dict(PRODUCT_LIST_PROJECTION)
+        sort = [("_id", 1)]
         
-        if size:
-            # Search for size within the sizes array OR old format
-            query_filter["$or"] = [
-                {"sizes.size": size},
-                {"size": size}  # Support old format
-            ]
+        if "$text" in query_filter:
+            # Order text index matches by relevance
+            projection["score"] = {"$meta": "textScore"}
+            sort = [("score", {"$meta": "textScore"}), ("_id", 1)]
         
-        # Get total count for the query
-        total_count = db_manager.products_collection.count_documents(query_filter)
+        if cursor is not None:
+            # Seek past the previous page using the _id index
+            query_filter["_id"] = {"$gt": ObjectId(cursor)}
         
-        # Execute query with pagination
-        cursor = (db_manager.products_collection
-                 .find(query_filter)
-                 .sort("_id", 1)
-                 .skip(offset)
-                 .limit(limit))
+        # Execute query with pagination, fetching one extra document to detect a next page
+        db_cursor = (db.products_collection
+                    .find(query_filter, projection)
+                    .sort(sort))
+        if cursor is None and offset:
+            db_cursor = db_cursor.skip(offset)
+        db_cursor = db_cursor.limit(limit + 1)
         
-        products = list(cursor)
+        products = await db_cursor.to_list(length=limit + 1)
+        has_more = len(products) > limit
+        products = products[:limit]
         
         # Prepare response - convert old format to new format if needed
         processed_products = []
         for product in products:
             processed_product = prepare_product_response(product)
             if processed_product:
+                processed_product.pop("score", None)
+                
                 # Convert old format to new format if needed
                 if "sizes" not in processed_product and "size" in processed_product:
                     processed_product["sizes"] = [{
@@ -101,17 +137,14 @@ async def list_products(
                 processed_products.append(processed_product)
         
         # Calculate pagination info
-        next_offset = offset + limit if offset + limit < total_count else None
-        prev_offset = max(0, offset - limit) if offset > 0 else None
+        next_page = products[-1]["_id"] if keyset and products else offset + limit
         
-        return {
+        response = {
             "data": processed_products,
-            "page": {
-                "next": str(next_offset) if next_offset is not None else None,
-                "limit": limit,
-                "previous": str(prev_offset) if prev_offset is not None else None
-            }
+            "page": build_page_info(limit, has_more, next_page, offset, cursor)
         }
+        product_list_cache.set(cache_key, response, cache_generation)
+        return response
         
     except Exception as e:
         print(f"Error fetching products: {e}")
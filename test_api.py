@@ -10,10 +10,13 @@ from datetime import datetime
 
 BASE_URL = "http://localhost:8000"
 
+# Reuse one keep-alive connection for every request
+SESSION = requests.Session()
+
 def test_health():
     """Test health endpoint"""
     print("Testing health endpoint...")
-    response = requests.get(f"{BASE_URL}/health")
+    response = SESSION.get(f"{BASE_URL}/health")
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     print()
@@ -32,7 +35,7 @@ def test_create_product():
         ]
     }
     
-    response = requests.post(f"{BASE_URL}/products", json=product_data)
+    response = SESSION.post(f"{BASE_URL}/products", json=product_data)
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     
@@ -43,7 +46,7 @@ def test_create_product():
 def test_list_products():
     """Test listing products"""
     print("\nTesting product listing...")
-    response = requests.get(f"{BASE_URL}/products")
+    response = SESSION.get(f"{BASE_URL}/products")
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     print()
@@ -52,12 +55,12 @@ def test_search_products():
     """Test product search"""
     print("Testing product search...")
     # Search by name
-    response = requests.get(f"{BASE_URL}/products?name=iPhone")
+    response = SESSION.get(f"{BASE_URL}/products?name=iPhone")
     print(f"Search by name - Status: {response.status_code}")
     print(f"Response: {response.json()}")
     
     # Search by size
-    response = requests.get(f"{BASE_URL}/products?size=large")
+    response = SESSION.get(f"{BASE_URL}/products?size=large")
     print(f"Search by size - Status: {response.status_code}")
     print(f"Response: {response.json()}")
     print()
@@ -87,7 +90,7 @@ def test_create_order(product_id):
         }
     }
     
-    response = requests.post(f"{BASE_URL}/orders", json=order_data)
+    response = SESSION.post(f"{BASE_URL}/orders", json=order_data)
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     
@@ -99,7 +102,7 @@ def test_get_user_orders():
     """Test getting user orders"""
     print("\nTesting user orders retrieval...")
     user_id = "user123"
-    response = requests.get(f"{BASE_URL}/orders/{user_id}")
+    response = SESSION.get(f"{BASE_URL}/orders/{user_id}")
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     print()
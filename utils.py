@@ -1,31 +1,93 @@
 """
 Utility functions for data processing
 """
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
 from bson import ObjectId
-from typing import Any, Dict, List, Union
+from fastapi.responses import ORJSONResponse
+from typing import Any, Dict, Hashable, List, Optional, Union
+
+import orjson
+
+# Values that are returned as-is, checked by exact type to skip isinstance dispatch
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None), datetime))
 
 def serialize_doc(doc: Union[Dict, List, Any]) -> Union[Dict, List, Any]:
     """
-    Convert MongoDB ObjectId to string recursively
+    Convert MongoDB ObjectId to string throughout a document
+
+    Walks nested dicts/lists with an explicit stack instead of recursion
     """
-    if doc is None:
-        return None
-        
-    if isinstance(doc, list):
-        return [serialize_doc(item) for item in doc]
+    if isinstance(doc, ObjectId):
+        return str(doc)
+    if not isinstance(doc, (dict, list)):
+        return doc
+    
+    root = {} if isinstance(doc, dict) else [None] * len(doc)
+    stack = [(doc, root)]
+    
+    while stack:
+        source, target = stack.pop()
+        entries = source.items() if isinstance(source, dict) else enumerate(source)
         
-    if isinstance(doc, dict):
-        serialized = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                serialized[key] = str(value)
-            elif isinstance(value, (dict, list)):
-                serialized[key] = serialize_doc(value)
+        for key, value in entries:
+            value_type = type(value)
+            if value_type in _SCALAR_TYPES:
+                target[key] = value
+            elif value_type is ObjectId:
+                target[key] = str(value)
+            elif isinstance(value, dict):
+                child = {}
+                target[key] = child
+                stack.append((value, child))
+            elif isinstance(value, list):
+                child = [None] * len(value)
+                target[key] = child
+                stack.append((value, child))
+            elif isinstance(value, ObjectId):
+                target[key] = str(value)
             else:
-                serialized[key] = value
-        return serialized
-        
-    return doc
+                target[key] = value
+    
+    return root
+
+def _json_default(value: Any) -> Any:
+    """
+    Encode values orjson does not support natively
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def encode_json(data: Any) -> bytes:
+    """
+    Encode response data as compact JSON with orjson
+    """
+    return orjson.dumps(data, default=_json_default)
+
+class MongoJSONResponse(ORJSONResponse):
+    """
+    orjson-backed JSON response that also encodes ObjectId values
+    """
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+def build_page_info(limit: int, has_more: bool, next_page: Any = None, offset: int = 0, cursor: str = None) -> Dict:
+    """
+    Build the page block of a list response
+
+    No total count is computed: has_more comes from fetching limit + 1 documents
+    """
+    prev_offset = max(0, offset - limit) if cursor is None and offset > 0 else None
+    
+    return {
+        "next": str(next_page) if has_more and next_page is not None else None,
+        "limit": limit,
+        "previous": str(prev_offset) if prev_offset is not None else None,
+        "has_more": has_more
+    }
 
 def prepare_product_response(product_doc: Dict) -> Dict:
     """
@@ -49,18 +111,87 @@ def prepare_order_response(order_doc: Dict) -> Dict:
     order["id"] = order.pop("_id")
     return order
 
-def build_product_query_filter(name: str = None, size: str = None) -> Dict:
+# Characters that make a name filter a regular expression rather than a plain prefix
+_REGEX_METACHARACTERS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+def build_name_regex(name: str) -> Dict:
+    """
+    Build a case-insensitive regex filter for product name
+
+    Plain text is matched as an anchored prefix (^name) so the name index can
+    be used; input containing regex metacharacters is used as the pattern as-is
+    """
+    if _REGEX_METACHARACTERS.search(name):
+        return {"$regex": name, "$options": "i"}
+    return {"$regex": f"^{re.escape(name)}", "$options": "i"}
+
+def build_product_query_filter(
+    name: str = None, size: str = None, prefix: bool = False, support_legacy_size: bool = False
+) -> Dict:
     """
     Build MongoDB query filter for product search
     """
     query_filter = {}
     
-    if name:
-        # Support partial/regex search for name (case-insensitive)
-        query_filter["name"] = {"$regex": name, "$options": "i"}
+    if name and prefix:
+        # Prefix/regex search for name (case-insensitive)
+        query_filter["name"] = build_name_regex(name)
+    elif name:
+        # Full-text search backed by the text index on name
+        query_filter["$text"] = {"$search": name}
     
-    if size:
+    if size and support_legacy_size:
+        # Search for size within the sizes array OR old format
+        query_filter["$or"] = [
+            {"sizes.size": size},
+            {"size": size}  # Support old format
+        ]
+    elif size:
         # Search for size within the sizes array
         query_filter["sizes.size"] = size
         
     return query_filter
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries expire after a fixed time
+
+    Each worker process keeps its own copy, so entries can be stale for up
+    to ttl_seconds after another worker writes. Within a worker, a value
+    computed before clear() is dropped by set() via the generation counter
+    """
+    def __init__(self, maxsize: int = 256, ttl_seconds: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        # Skip values read before the cache was last cleared
+        if generation is not None and generation != self.generation:
+            return
+        
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+# Cached list_products responses; cleared whenever products or their inventory change
+product_list_cache = TTLCache(maxsize=256, ttl_seconds=30.0)